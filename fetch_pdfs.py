@@ -1,40 +1,307 @@
 import os
 import re
+import time
+import shutil
 import asyncio
+from urllib.parse import urlsplit
 from playwright.async_api import async_playwright
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from datetime import datetime
 
-async def convert_to_pdf(url, output_dir="pdfs"):
-    """Convert PIB page to PDF using headless browser"""
+# Number of pages rendered at once, each in its own browser context
+CONCURRENCY = int(os.environ.get("PDF_CONCURRENCY", "8"))
+# Maximum requests per second started against pib.gov.in (0 disables)
+RATE_LIMIT = float(os.environ.get("PDF_RATE_LIMIT", "4"))
+# Resource types the browser never fetches when rendering a page; images and
+# fonts appear in the PDF, so blocking them (e.g. "image,font,media") is opt-in
+BLOCKED_RESOURCES = set(os.environ.get("PDF_BLOCK_RESOURCES", "media").split(","))
+# Analytics and ad hosts whose requests are always aborted, whatever the resource type
+BLOCKED_HOSTS = (
+    'google-analytics.com',
+    'googletagmanager.com',
+    'doubleclick.net',
+    'googlesyndication.com',
+    'facebook.net',
+    'addthis.com',
+    'sharethis.com',
+)
+# Browser contexts kept open for rendering, and pages each one serves before it is replaced
+BROWSER_POOL_SIZE = int(os.environ.get("BROWSER_POOL_SIZE", "4"))
+BROWSER_POOL_RECYCLE_AFTER = int(os.environ.get("BROWSER_POOL_RECYCLE_AFTER", "100"))
+# Read size when streaming PDFs to disk; large enough to keep syscalls per MB low
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+# Smallest GeneratePdf response accepted as a real press release rather than a stub
+MIN_DIRECT_PDF_BYTES = 4096
+
+# Copies of GeneratePdf downloads from earlier runs; kept apart from pdfs/ so
+# only this run's releases are uploaded and reported
+PDF_CACHE_DIR = os.environ.get("PIB_PDF_CACHE", ".pib_cache/pdfs")
+# Cached PDFs neither downloaded nor reused for this many days are pruned (0 keeps all)
+PDF_CACHE_MAX_AGE_DAYS = float(os.environ.get("PIB_PDF_CACHE_MAX_AGE_DAYS", "30"))
+
+# Ways of getting a press release as PDF, cheapest first; "auto" tries each in turn
+STRATEGIES = ("direct_pdf", "browser_render")
+
+class Throttle:
+    """Space out request starts so at most `rate` begin per second"""
+    
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate > 0 else 0
+        self.next_slot = 0.0
+    
+    async def wait(self):
+        if not self.interval:
+            return
+        now = time.monotonic()
+        slot = max(now, self.next_slot)
+        self.next_slot = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+throttle = Throttle(RATE_LIMIT)
+
+# One keep-alive session so repeated downloads from pib.gov.in reuse the connection
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=20,
+    pool_maxsize=20,
+    max_retries=Retry(total=2, backoff_factor=0.3, status_forcelist=[502, 503, 504])
+))
+
+_PRID_RE = re.compile(r'PRID=(\d+)')
+
+def _prid(url):
+    """Extract the press release ID from a PIB URL, or None"""
+    match = _PRID_RE.search(url)
+    return match.group(1) if match else None
+
+def cache_pdf(filename, cached):
+    """Keep a copy of a release PDF for later runs, written atomically"""
+    os.makedirs(os.path.dirname(cached), exist_ok=True)
+    shutil.copyfile(filename, f"{cached}.part")
+    os.replace(f"{cached}.part", cached)
+
+def prune_pdf_cache():
+    """Delete cached PDFs that no run has downloaded or reused lately"""
+    if PDF_CACHE_MAX_AGE_DAYS <= 0 or not os.path.isdir(PDF_CACHE_DIR):
+        return
+    cutoff = time.time() - PDF_CACHE_MAX_AGE_DAYS * 86400
+    with os.scandir(PDF_CACHE_DIR) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+
+async def fetch(url, strategy="auto", output_dir="pdfs"):
+    """Fetch the PDF for a PIB URL using one strategy, or each of them in order"""
+    prid = _prid(url)
+    if not prid:
+        print(f"✗ No PRID found in {url}, skipping")
+        return None
+    
     os.makedirs(output_dir, exist_ok=True)
-    prid = re.search(r'PRID=(\d+)', url).group(1)
     filename = f"{output_dir}/pib_{prid}.pdf"
     
+    for name in (STRATEGIES if strategy == "auto" else (strategy,)):
+        if name == "direct_pdf":
+            result = await direct_download_pdf(url, prid, filename)
+        else:
+            result = await convert_to_pdf(url, filename)
+        
+        if result:
+            return result
+        print(f"⚠️ {name} produced no PDF for {url}")
+    return None
+
+def download_pdf(pdf_url, filename, min_size=0):
+    """Stream a PDF URL to disk, returning None if the response is not a PDF"""
+    with SESSION.get(pdf_url, stream=True, timeout=30) as response:
+        if 'application/pdf' not in response.headers.get('content-type', ''):
+            return None
+        
+        # Stream straight to disk instead of buffering the whole PDF;
+        # write to a temp name so an interrupted download is never reused
+        response.raw.decode_content = True
+        partial = f"{filename}.part"
+        try:
+            with open(partial, 'wb') as f:
+                shutil.copyfileobj(response.raw, f, length=DOWNLOAD_CHUNK_SIZE)
+        except Exception:
+            # pdfs/ is uploaded whole, so don't leave a truncated file in it
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+    
+    if os.path.getsize(partial) < min_size:
+        os.remove(partial)
+        return None
+    os.replace(partial, filename)
+    return filename
+
+async def direct_download_pdf(url, prid, filename):
+    """Download the PDF PIB generates server-side for a press release"""
+    # GeneratePdf output is immutable per PRID, so a previous run's file is reusable
+    if os.path.exists(filename) and os.path.getsize(filename) > 0:
+        print(f"✓ Already downloaded: {filename}")
+        return filename
+    cached = f"{PDF_CACHE_DIR}/pib_{prid}.pdf"
+    if os.path.exists(cached) and os.path.getsize(cached) > 0:
+        await asyncio.to_thread(shutil.copyfile, cached, filename)
+        # Mark the copy as recently used so pruning keeps it
+        os.utime(cached)
+        print(f"✓ Reused cached PDF: {filename}")
+        return filename
+    
     try:
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=True)
-            context = await browser.new_context(
-                java_script_enabled=True,
-                viewport={'width': 1280, 'height': 1080}
+        pdf_url = f"https://pib.gov.in/Utilities/GeneratePdf.aspx?ID={prid}"
+        await throttle.wait()
+        # requests is blocking, so keep it off the event loop
+        result = await asyncio.to_thread(download_pdf, pdf_url, filename, MIN_DIRECT_PDF_BYTES)
+    except Exception as e:
+        print(f"✗ Direct download failed for {url}: {str(e)[:200]}")
+        return None
+    
+    if result:
+        await asyncio.to_thread(cache_pdf, result, cached)
+    return result
+
+async def block_resources(route):
+    """Abort requests for resources the PDF does not need"""
+    host = urlsplit(route.request.url).hostname or ''
+    if route.request.resource_type in BLOCKED_RESOURCES or host.endswith(BLOCKED_HOSTS):
+        await route.abort()
+    else:
+        await route.continue_()
+
+# Shared Chromium, launched on first render so HTTP-only runs never start it
+_playwright = None
+_browser = None
+_browser_lock = asyncio.Lock()
+
+async def get_browser():
+    """Return the shared browser, launching it on first use or after a crash"""
+    global _playwright, _browser
+    async with _browser_lock:
+        if _browser is not None and not _browser.is_connected():
+            # Chromium died mid-run and took every pooled context with it
+            print("⚠️ Browser disconnected, relaunching...")
+            _browser = None
+            contexts.reset()
+        if _browser is None:
+            # Keep one driver even if a launch fails, so retries don't leak processes
+            if _playwright is None:
+                _playwright = await async_playwright().start()
+            _browser = await _playwright.chromium.launch(
+                headless=True,
+                args=['--disable-extensions', '--disable-dev-shm-usage']
             )
-            page = await context.new_page()
-            
-            # Set longer timeout and wait for full load
-            await page.goto(url, timeout=90000, wait_until='networkidle')
+    return _browser
+
+class ContextPool:
+    """Reusable browser contexts, each replaced after `recycle_after` pages"""
+    
+    def __init__(self, size, recycle_after):
+        self.size = size
+        self.recycle_after = recycle_after
+        self.uses = {}
+        # None marks a free slot whose context has not been created yet
+        self.idle = asyncio.Queue()
+        for _ in range(size):
+            self.idle.put_nowait(None)
+    
+    async def acquire(self):
+        """Wait for a free slot and return its context, creating it if needed"""
+        context = await self.idle.get()
+        try:
+            # Relaunches a crashed browser, which makes the pool forget its contexts
+            browser = await get_browser()
+            if context not in self.uses:
+                context = await self._new_context(browser)
+        except Exception:
+            self.idle.put_nowait(None)
+            raise
+        return context
+    
+    async def release(self, context, discard=False):
+        """Give a context back, closing it once worn out or when `discard` is set"""
+        if context in self.uses:
+            self.uses[context] += 1
+            if not discard and self.uses[context] < self.recycle_after:
+                self.idle.put_nowait(context)
+                return
+            del self.uses[context]
+        # Chromium leaks memory across pages, so start the slot afresh; a context
+        # the pool no longer knows belonged to a browser that has since gone away
+        self.idle.put_nowait(None)
+        try:
+            await context.close()
+        except Exception:
+            pass  # Already gone, e.g. the browser crashed
+    
+    async def _new_context(self, browser):
+        context = await browser.new_context(
+            java_script_enabled=True,
+            viewport={'width': 1280, 'height': 1080}
+        )
+        # Skip heavy assets before they are requested, not after load
+        await context.route("**/*", block_resources)
+        self.uses[context] = 0
+        return context
+    
+    def reset(self):
+        """Forget all contexts, e.g. once the browser that owns them is closed or has crashed"""
+        # Idle contexts are replaced when next acquired, borrowed ones when released
+        self.uses.clear()
+        if self.idle.qsize() == self.size:
+            # Nothing is borrowed, so start a fresh queue that the next event loop can use
+            self.idle = asyncio.Queue()
+            for _ in range(self.size):
+                self.idle.put_nowait(None)
+
+contexts = ContextPool(BROWSER_POOL_SIZE, BROWSER_POOL_RECYCLE_AFTER)
+
+async def close_browser():
+    """Shut down the shared browser and its driver if they were ever started"""
+    global _playwright, _browser
+    try:
+        if _browser is not None:
+            # Closing the browser closes every context in the pool with it
+            await _browser.close()
+    finally:
+        _browser = None
+        contexts.reset()
+        if _playwright is not None:
+            try:
+                await _playwright.stop()
+            finally:
+                _playwright = None
+
+async def convert_to_pdf(url, filename):
+    """Convert PIB page to PDF on a pooled context of the shared browser"""
+    context = None
+    healthy = False
+    try:
+        context = await contexts.acquire()
+        page = await context.new_page()
+        try:
+            # Only the article body matters, so don't wait for trackers to go idle
+            await throttle.wait()
+            await page.goto(url, timeout=30000, wait_until='domcontentloaded')
+            try:
+                await page.wait_for_selector('#ContentPlaceHolder1_Content', state='attached', timeout=10000)
+            except Exception:
+                await page.wait_for_load_state('load')
             
-            # Clean up page before PDF generation
-            await page.evaluate('''() => {
-                // Remove unnecessary elements
-                const elements = document.querySelectorAll(
-                    'iframe, script, noscript, header, footer, nav, .social-share'
-                );
-                elements.forEach(el => el.remove());
-                
-                // Improve PDF readability
-                document.body.style.padding = '20px';
-                document.body.style.fontSize = '12pt';
-            }''')
+            # Hide page chrome and improve readability via print CSS
+            await page.add_style_tag(content='''
+                @media print {
+                    iframe, script, noscript, header, footer, nav, .social-share {
+                        display: none !important;
+                    }
+                    body { padding: 20px; font-size: 12pt; }
+                }
+            ''')
             
             await page.pdf(
                 path=filename,
@@ -42,48 +309,73 @@ async def convert_to_pdf(url, output_dir="pdfs"):
                 print_background=True,
                 margin={'top': '20mm', 'right': '20mm', 'bottom': '20mm', 'left': '20mm'}
             )
-            return filename
-            
-    except Exception as e:
-        print(f"⚠️ Browser conversion failed for {url}, trying direct download... Error: {str(e)[:200]}")
-        return await direct_download_pdf(url, prid, filename)
-
-async def direct_download_pdf(url, prid, filename):
-    """Fallback to direct PDF download"""
-    try:
-        pdf_url = f"https://pib.gov.in/Utilities/GeneratePdf.aspx?ID={prid}"
-        response = requests.get(pdf_url, timeout=30)
-        
-        if 'application/pdf' in response.headers.get('content-type', ''):
-            with open(filename, 'wb') as f:
-                f.write(response.content)
-            return filename
-        return None
+        finally:
+            await page.close()
+        healthy = True
+        return filename
+    
     except Exception as e:
-        print(f"✗ Direct download failed for {url}: {str(e)[:200]}")
+        print(f"✗ Browser conversion failed for {url}: {str(e)[:200]}")
         return None
+    finally:
+        # A context that just failed may be wedged, so don't hand it out again
+        if context is not None:
+            await contexts.release(context, discard=not healthy)
 
-async def process_urls(urls):
-    """Process URLs with progress tracking"""
-    results = []
-    for i, url in enumerate(urls, 1):
-        print(f"\n🔍 Processing URL {i}/{len(urls)}: {url}")
-        result = await convert_to_pdf(url)
+async def process_urls(urls, strategy="auto"):
+    """Process URLs concurrently, sharing one browser for any renders"""
+    sem = asyncio.Semaphore(CONCURRENCY)
+    
+    async def process_one(i, url):
+        async with sem:
+            print(f"\n🔍 Processing URL {i}/{len(urls)}: {url}")
+            result = await fetch(url, strategy)
         if result:
             print(f"✓ Generated: {result}")
-            results.append({
-                "url": url,
+            return {
                 "pdf_path": result,
                 "timestamp": datetime.now().isoformat()
-            })
+            }
+        return None
+    
+    # URLs that share a PRID resolve to the same PDF, so fetch it once
+    jobs = {}
+    for i, url in enumerate(urls, 1):
+        key = _prid(url) or url
+        if key not in jobs:
+            jobs[key] = asyncio.ensure_future(process_one(i, url))
+    
+    try:
+        # One failing URL must not abort the rest of the batch
+        outcomes = await asyncio.gather(*jobs.values(), return_exceptions=True)
+    finally:
+        await close_browser()
+    await asyncio.to_thread(prune_pdf_cache)
+    
+    finished = {}
+    for key, outcome in zip(jobs, outcomes):
+        if isinstance(outcome, Exception):
+            print(f"✗ Processing failed for {key}: {str(outcome)[:200]}")
+            outcome = None
+        finished[key] = outcome
+    
+    results = []
+    for url in urls:
+        job = finished[_prid(url) or url]
+        if job:
+            results.append({"url": url, **job})
     return results
 
 if __name__ == "__main__":
     import sys
+    strategy = os.environ.get("PDF_STRATEGY", "auto")
+    if strategy != "auto" and strategy not in STRATEGIES:
+        sys.exit(f"Unknown PDF_STRATEGY {strategy!r}, expected auto or one of {', '.join(STRATEGIES)}")
+    
     urls = sys.argv[1:] if len(sys.argv) > 1 else [
         "https://pib.gov.in/PressReleaseIframePage.aspx?PRID=2138491"  # Default test URL
     ]
     
     print("🚀 Starting PDF conversion for", len(urls), "URLs")
-    successful = asyncio.run(process_urls(urls))
+    successful = asyncio.run(process_urls(urls, strategy))
     print(f"\n🎉 Successfully converted {len(successful)}/{len(urls)} URLs")